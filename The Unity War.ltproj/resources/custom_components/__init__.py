@@ -1,10 +1,47 @@
 import os
+import re
+import sys
+import time
 import importlib
+import logging
 
+# Set LT_PROFILE_IMPORTS=1 to print how long each custom component module takes to load
+# and which modules it pulled in. Run the engine with python -X importtime for the full
+# import tree with cumulative times.
+profile_imports = bool(os.environ.get('LT_PROFILE_IMPORTS'))
+
+# Modules that were loaded before this import are stale and get reloaded. The rest were
+# just run by import_module (or by another custom module importing them), so reloading
+# them again would only run every class definition a second time.
+loaded_modules = set(sys.modules)
 for module_name in os.listdir(os.path.dirname(__file__)):
     if module_name == '__init__.py' or module_name[-3:] != '.py':
         continue
     print("Importing Custom Components in %s..." % module_name)
-    module = importlib.import_module('custom_components.' + module_name[:-3])
-    importlib.reload(module)
-del module_name
\ No newline at end of file
+    full_name = 'custom_components.' + module_name[:-3]
+    modules_before = set(sys.modules)
+    start = time.perf_counter()
+    module = importlib.import_module(full_name)
+    if full_name in loaded_modules:
+        importlib.reload(module)
+    if profile_imports:
+        new_modules = sorted(set(sys.modules) - modules_before)
+        print("  %s loaded in %.1f ms, %d new modules: %s" % (module_name, (time.perf_counter() - start) * 1000, len(new_modules), ', '.join(new_modules)))
+    # Components are looked up by nid, so a second class with the same nid in a file
+    # silently shadows the first one. Read the nids from the source rather than the
+    # module, where a class that reuses an earlier class's name has already replaced it.
+    component_nids = {}
+    class_name = None
+    with open(os.path.join(os.path.dirname(__file__), module_name), encoding='utf-8') as source:
+        for line in source:
+            if line.startswith('class '):
+                class_name = re.match(r'class (\w+)', line).group(1)
+                continue
+            match = class_name and re.match(r"    nid = (['\"])(.+?)\1", line)
+            if match:
+                nid = match.group(2)
+                if nid in component_nids:
+                    logging.warning("Duplicate component nid %s in %s (%s, %s)", nid, module_name, component_nids[nid], class_name)
+                component_nids[nid] = class_name
+                class_name = None
+del module_name
@@ -3,30 +3,57 @@ from __future__ import annotations
 from app.data.database.components import ComponentType
 from app.data.database.database import DB
 from app.data.database.item_components import ItemComponent, ItemTags
-from app.engine import (action, banner, combat_calcs, engine, equations,
-                        image_mods, item_funcs, item_system, skill_system,
-                        target_system, evaluate)
+from app.engine import (action, banner, combat_calcs, equations, item_funcs,
+                        item_system, skill_system, evaluate)
 
 from app.engine.game_state import game
-from app.engine.objects.unit import UnitObject
-from app.utilities import utils, static_random
+from app.utilities import utils
 from app.engine.movement import movement_funcs
 import app.engine.combat.playback as pb
-import logging
 from app.data.database.difficulty_modes import RNGOption
 from app.engine.item_components.hit_components import Steal
 
-from app.data.database.skill_components import SkillComponent, SkillTags
+from custom_components.custom_skill_components import count_skill, has_skill, trigger_event
 
-from app.engine.skill_components import advanced_components
-
-from app.utilities import utils, static_random
 from app.data.resources.resources import RESOURCES
 from app.engine import config as cf
-from app.engine.combat import playback as pb
 import random, logging
 
-
+# Every position on the current map. Targeting and AoE components that cover the whole
+# map share this instead of rebuilding a tuple per tile on every call.
+_map_positions = {}
+
+def get_map_positions() -> frozenset:
+    tilemap = game.tilemap
+    key = (tilemap.nid, tilemap.width, tilemap.height)
+    if key not in _map_positions:
+        _map_positions.clear()
+        _map_positions[key] = frozenset((x, y) for x in range(tilemap.width) for y in range(tilemap.height))
+    return _map_positions[key]
+
+# Number of sfx whose nid contains a given name, e.g. a unit's attack voice clips.
+# Voice components used to scan the whole sfx catalog on every hit and miss; the
+# catalog doesn't change during play, so the counts are kept until its size does.
+_sound_counts = {}
+_sound_catalog_size = None
+
+def get_num_sounds(sound_name) -> int:
+    global _sound_catalog_size
+    if len(RESOURCES.sfx) != _sound_catalog_size:
+        _sound_counts.clear()
+        _sound_catalog_size = len(RESOURCES.sfx)
+    if sound_name not in _sound_counts:
+        _sound_counts[sound_name] = sum(1 for nid in RESOURCES.sfx.keys() if sound_name in nid)
+    return _sound_counts[sound_name]
+
+# AoE items run their on_hit for every target into the same strike playback, so the
+# same map sound ('No Damage', 'MapHeal') used to be queued once per target and all
+# played at once. Only queue a sound if the strike doesn't already have it.
+def add_hit_sound(playback, sound, map_only=False):
+    for brush in playback:
+        if brush.nid == 'hit_sound' and brush.sound == sound:
+            return
+    playback.append(pb.HitSound(sound, map_only=map_only))
 
 
 class DoNothing(ItemComponent):
@@ -246,7 +273,7 @@ class DamageAny(ItemComponent):
         # For animation
         playback.append(pb.DamageHit(unit, item, target, damage, true_damage))
         if damage == 0:
-            playback.append(pb.HitSound('No Damage'))
+            add_hit_sound(playback, 'No Damage')
             playback.append(pb.HitAnim('MapNoDamage', target))
 
     def on_glancing_hit(self, actions, playback, unit, item, target, item2, target_pos, mode, attack_info):
@@ -290,7 +317,7 @@ class DamageAny(ItemComponent):
 
         playback.append(pb.DamageCrit(unit, item, target, damage, true_damage))
         if damage == 0:
-            playback.append(pb.HitSound('No Damage'))
+            add_hit_sound(playback, 'No Damage')
             playback.append(pb.HitAnim('MapNoDamage', target))
 
 class ShoveOnEndCombatInitiate(ItemComponent):
@@ -755,7 +782,7 @@ class EvalDamage(ItemComponent):
         # For animation
         playback.append(pb.DamageHit(unit, item, target, damage, true_damage))
         if damage == 0:
-            playback.append(pb.HitSound('No Damage'))
+            add_hit_sound(playback, 'No Damage')
             playback.append(pb.HitAnim('MapNoDamage', target))
 
     def on_glancing_hit(self, actions, playback, unit, item, target, item2, target_pos, mode, attack_info):
@@ -799,11 +826,11 @@ class EvalDamage(ItemComponent):
 
         playback.append(pb.DamageCrit(unit, item, target, damage, true_damage))
         if damage == 0:
-            playback.append(pb.HitSound('No Damage'))
+            add_hit_sound(playback, 'No Damage')
             playback.append(pb.HitAnim('MapNoDamage', target))
 
     def ai_status_priority_buff(unit, target, item, move, status_nid) -> float:
-        if target and status_nid not in [skill.nid for skill in target.skills]:
+        if target and not has_skill(target, status_nid):
             accuracy_term = utils.clamp(combat_calcs.compute_hit(unit, target, item, target.get_weapon(), "attack", (0, 0))/100., 0, 1)
             num_attacks = combat_calcs.outspeed(unit, target, item, target.get_weapon(), "attack", (0, 0))
             accuracy_term *= num_attacks
@@ -1050,7 +1077,7 @@ class StackCost(ItemComponent):
     expose = ComponentType.Skill  # Nid
     
     def available(self, unit, item) -> bool:
-        return self.value in [s.nid for s in unit.skills]
+        return has_skill(unit, self.value)
 
     def start_combat(self, playback, unit, item, target, item2, mode):
         action.do(action.AddSkill(unit, self.value, unit))
@@ -1207,8 +1234,8 @@ class StatusOnGlancingHit(ItemComponent):
         return ai_status_priority(unit, target, item, move, self.value)
 
 class SelfStatusOnGlancingHit(ItemComponent):
-    nid = 'self_status_on_true_hit'
-    desc = "User gains the specified status on true hit. Applies instantly, potentially causing values to change mid-combat."
+    nid = 'self_status_on_glancing_hit'
+    desc = "User gains the specified status on glancing hit. Applies instantly, potentially causing values to change mid-combat."
     tag = ItemTags.SPECIAL
 
     expose = ComponentType.Skill  # Nid
@@ -1296,9 +1323,9 @@ class ShoveFlexibleStopsEvent(ItemComponent):
             else:
                 magnitude = 0
                 if game.board.get_unit(new_position):
-                    game.events.trigger_specific_event(self.value.get('impact_event'), unit_to_move, game.board.get_unit(new_position), unit_to_move.position)
+                    trigger_event(self.value.get('impact_event'), unit_to_move, game.board.get_unit(new_position), unit_to_move.position)
                 else:
-                    game.events.trigger_specific_event(self.value.get('impact_event'), unit_to_move, None, unit_to_move.position)
+                    trigger_event(self.value.get('impact_event'), unit_to_move, None, unit_to_move.position)
         if not ret_position:
             return False
         return ret_position
@@ -1311,7 +1338,7 @@ class ShoveFlexibleStopsEvent(ItemComponent):
                 playback.append(pb.ShoveHit(unit, item, target))
 
     def ai_status_priority(unit, target, item, move, status_nid) -> float:
-        if target and status_nid not in [skill.nid for skill in target.skills]:
+        if target and not has_skill(target, status_nid):
             accuracy_term = utils.clamp(combat_calcs.compute_hit(unit, target, item, target.get_weapon(), "attack", (0, 0))/100., 0, 1)
             num_attacks = combat_calcs.outspeed(unit, target, item, target.get_weapon(), "attack", (0, 0))
             accuracy_term *= num_attacks
@@ -1360,7 +1387,7 @@ class StackCostMulti(ItemComponent):
             self.value.update(value)
     
     def available(self, unit, item) -> bool:
-        return len([s.nid for s in unit.skills if s.nid == self.value.get('skill')]) >= self.value.get('amount')
+        return count_skill(unit, self.value.get('skill')) >= self.value.get('amount')
 
     def start_combat(self, playback, unit, item, target, item2, mode):
         action.do(action.RemoveSkill(unit, self.value.get('skill'), self.value.get('amount')))
@@ -1396,7 +1423,7 @@ class SolomonHeal(ItemComponent):
         # For animation
         if is_heal and true_heal > 0:
             playback.append(pb.HealHit(unit, item, target, heal, true_heal))
-            playback.append(pb.HitSound('MapHeal', map_only=True))
+            add_hit_sound(playback, 'MapHeal', map_only=True)
             if heal >= 30:
                 name = 'MapBigHealTrans'
             elif heal >= 15:
@@ -1406,7 +1433,7 @@ class SolomonHeal(ItemComponent):
             playback.append(pb.HitAnim(name, target))
         else:
             playback.append(pb.DamageHit(unit, item, target, abs(heal), abs(true_heal)))
-            playback.append(pb.HitSound('MapHeal', map_only=True))
+            add_hit_sound(playback, 'MapHeal', map_only=True)
 
 class StatusAfterCombatOnHitFoeOnly(ItemComponent):
     nid = 'status_after_combat_on_hit_foe_only'
@@ -1586,7 +1613,7 @@ class SelfRemoveSkill(ItemComponent):
     expose = ComponentType.Skill
 
     def end_combat(self, playback, unit, item, target, item2, mode):
-        remove_amount = len([s for s in unit.skills if s.nid == self.value])
+        remove_amount = count_skill(unit, self.value)
         action.do(action.RemoveSkill(unit, self.value, remove_amount))
 
 class EvalAllyBlastAOE(ItemComponent):
@@ -1656,7 +1683,7 @@ class EvalStackCost(ItemComponent):
     
     def available(self, unit, item) -> bool:
         try:
-            return len([s for s in unit.skills if s.nid == self.value.get('skill')]) >= int(evaluate.evaluate(self.value.get('amount'), unit, local_args={'item': item}))
+            return count_skill(unit, self.value.get('skill')) >= int(evaluate.evaluate(self.value.get('amount'), unit, local_args={'item': item}))
         except Exception as e:
             logging.error("EVAL STACK COST: Couldn't evaluate %s conditional (%s)", self.value.get('amount'), e)
             return False
@@ -1714,7 +1741,7 @@ class HealNoTargetRestrict(ItemComponent):
         # For animation
         if true_heal > 0:
             playback.append(pb.HealHit(unit, item, target, heal, true_heal))
-            playback.append(pb.HitSound('MapHeal', map_only=True))
+            add_hit_sound(playback, 'MapHeal', map_only=True)
             if heal >= 30:
                 name = 'MapBigHealTrans'
             elif heal >= 15:
@@ -1767,7 +1794,7 @@ class EvalDamageAny(ItemComponent):
         # For animation
         playback.append(pb.DamageHit(unit, item, target, damage, true_damage))
         if damage == 0:
-            playback.append(pb.HitSound('No Damage'))
+            add_hit_sound(playback, 'No Damage')
             playback.append(pb.HitAnim('MapNoDamage', target))
 
     def on_glancing_hit(self, actions, playback, unit, item, target, item2, target_pos, mode, attack_info):
@@ -1811,7 +1838,7 @@ class EvalDamageAny(ItemComponent):
 
         playback.append(pb.DamageCrit(unit, item, target, damage, true_damage))
         if damage == 0:
-            playback.append(pb.HitSound('No Damage'))
+            add_hit_sound(playback, 'No Damage')
             playback.append(pb.HitAnim('MapNoDamage', target))
 
 class TargetsAnythingExceptAllies(ItemComponent):
@@ -1820,9 +1847,8 @@ class TargetsAnythingExceptAllies(ItemComponent):
     tag = ItemTags.TARGET
 
     def valid_targets(self, unit, item) -> set:
-        all_pos = {(x, y) for x in range(game.tilemap.width) for y in range(game.tilemap.height)}
-        all_pos = {z for z in all_pos if not (game.board.get_unit(z) and skill_system.check_ally(unit, game.board.get_unit(z)))}
-        return all_pos
+        ally_pos = {other.position for other in game.units if other.position and skill_system.check_ally(unit, other)}
+        return set(get_map_positions() - ally_pos)
 
 class EvalHeal(ItemComponent):
     nid = 'eval_heal'
@@ -1851,7 +1877,7 @@ class EvalHeal(ItemComponent):
         # For animation
         if true_heal > 0:
             playback.append(pb.HealHit(unit, item, target, heal, true_heal))
-            playback.append(pb.HitSound('MapHeal', map_only=True))
+            add_hit_sound(playback, 'MapHeal', map_only=True)
             if heal >= 30:
                 name = 'MapBigHealTrans'
             elif heal >= 15:
@@ -1907,8 +1933,7 @@ class AllUnitsAOE(ItemComponent):
 
     def splash_positions(self, unit, item, position) -> set:
         # All positions
-        splash = {(x, y) for x in range(game.tilemap.width) for y in range(game.tilemap.height)}
-        return splash
+        return set(get_map_positions())
 
 class CopysafeStatusOnHit(ItemComponent):
     nid = 'copysafe_status_on_hit'
@@ -2299,29 +2324,27 @@ class MapAttackVoice(ItemComponent):
     def on_hit(self, actions, playback, unit, item, target, item2, target_pos, mode, attack_info):
         #Determine whether to play a voice clip depending on game options.
         if unit and cf.SETTINGS['combat_voices']:
-            #Get the unit's list of attack voice clips.
-            sound_list = RESOURCES.sfx.keys()
+            #Get the number of attack voice clips the unit has.
             sound_name = unit.nid + 'Attack'
-            unit_sounds = [i for i in sound_list if sound_name in i]
+            num_sounds = get_num_sounds(sound_name)
             #Randomly determine which voice clip to play.
-            if len(unit_sounds) > 0:
-                sound = sound_name + str(random.randint(1, len(unit_sounds)))
+            if num_sounds > 0:
+                sound = sound_name + str(random.randint(1, num_sounds))
                 playback.append(pb.AttackVoice(sound))
 
     def on_miss(self, actions, playback, unit, item, target, item2, target_pos, mode, attack_info):
         #Determine whether to play a voice clip depending on game options.
         if unit and cf.SETTINGS['combat_voices']:
-            #Get the unit's list of attack voice clips.
-            sound_list = RESOURCES.sfx.keys()
+            #Get the number of attack voice clips the unit has.
             sound_name = unit.nid + 'Attack'
-            unit_sounds = [i for i in sound_list if sound_name in i]
+            num_sounds = get_num_sounds(sound_name)
             #Randomly determine which voice clip to play.
-            if len(unit_sounds) > 0:
-                sound = sound_name + str(random.randint(1, len(unit_sounds)))
+            if num_sounds > 0:
+                sound = sound_name + str(random.randint(1, num_sounds))
                 playback.append(pb.AttackVoice(sound))
 
 class EvalMaxRange(ItemComponent):
-    nid = 'eval_max_range'
+    nid = 'eval_modify_max_range'
     desc = "Modifies the maximum_range of the item by a given equation"
     tag = ItemTags.TARGET
 
@@ -2336,58 +2359,6 @@ class EvalMaxRange(ItemComponent):
             logging.error("Couldn't evaluate %s conditional (%s)", self.value, e)
         return 1
 
-
-
-
-
-
-
-
-class MapAttackVoice(ItemComponent):
-    nid = 'map_attack_voice'
-    desc = "When item is used the character plays a random attack voice clip."
-    tag = ItemTags.AESTHETIC
-
-    author = 'Beccarte'
-
-    def on_hit(self, actions, playback, unit, item, target, item2, target_pos, mode, attack_info):
-        #Determine whether to play a voice clip depending on game options.
-        if unit and cf.SETTINGS['combat_voices']:
-            #Get the unit's list of attack voice clips.
-            sound_list = RESOURCES.sfx.keys()
-            sound_name = unit.nid + 'Attack'
-            unit_sounds = [i for i in sound_list if sound_name in i]
-            #Randomly determine which voice clip to play.
-            if len(unit_sounds) > 0:
-                sound = sound_name + str(random.randint(1, len(unit_sounds)))
-                get_sound_thread().play_sfx(sound)
-
-    def on_miss(self, actions, playback, unit, item, target, item2, target_pos, mode, attack_info):
-        #Determine whether to play a voice clip depending on game options.
-        if unit and cf.SETTINGS['combat_voices']:
-            #Get the unit's list of attack voice clips.
-            sound_list = RESOURCES.sfx.keys()
-            sound_name = unit.nid + 'Attack'
-            unit_sounds = [i for i in sound_list if sound_name in i]
-            #Randomly determine which voice clip to play.
-            if len(unit_sounds) > 0:
-                sound = sound_name + str(random.randint(1, len(unit_sounds)))
-                get_sound_thread().play_sfx(sound)
-
-class RestoreNoRestriction(ItemComponent):
-    nid = 'restore_no_restriction'
-    desc = "Item removes all negative statuses from target on hit. Can be used on targets with no status."
-    tag = ItemTags.UTILITY
-
-    def _can_be_restored(self, status):
-        return status.negative
-
-    def on_hit(self, actions, playback, unit, item, target, item2, target_pos, mode, attack_info):
-        for skill in target.all_skills[:]:
-            if self._can_be_restored(skill):
-                actions.append(action.RemoveSkill(target, skill))
-                playback.append(pb.RestoreHit(unit, item, target))
-
            
 class StealPlus(Steal):
     nid = 'steal_plus'
@@ -2493,7 +2464,7 @@ class EventOnHit(ItemComponent):
     value = ''
     
     def on_hit(self, actions, playback, unit, item, target, item2, target_pos, mode, attack_info):
-        game.events.trigger_specific_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode, 'target_pos': target_pos})
+        trigger_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode, 'target_pos': target_pos})
         
 class SuperEclipse(ItemComponent):
     nid = 'super_eclipse'
@@ -2507,7 +2478,7 @@ class SuperEclipse(ItemComponent):
         # For animation
         playback.append(pb.DamageHit(unit, item, target, damage, true_damage))
         if true_damage == 0:
-            playback.append(pb.HitSound('No Damage'))
+            add_hit_sound(playback, 'No Damage')
             playback.append(pb.HitAnim('MapNoDamage', target))
 
        
@@ -3,9 +3,7 @@ from __future__ import annotations
 from app.data.database.components import ComponentType
 from app.data.database.database import DB
 from app.data.database.skill_components import SkillComponent, SkillTags
-from app.engine import (action, banner, combat_calcs, engine, equations,
-                        image_mods, item_funcs, item_system, skill_system,
-                        target_system)
+from app.engine import action, equations, item_funcs, item_system, skill_system
 from app.engine.game_state import game
 from app.engine.objects.unit import UnitObject
 
@@ -13,16 +11,49 @@ from app.utilities import utils, static_random
 from app.engine.combat import playback as pb
 from app.utilities.enums import Strike
 
-from app.data.database.item_components import ItemComponent, ItemTags
-
-from app.engine.skill_components import advanced_components
-
-from app.data.resources.resources import RESOURCES
-from app.engine import config as cf
-
 import random, logging
 
-
+# Identifies the current action log state by the last action done. After a turnwheel
+# rewind the next action lands on an index that was used before, so the index alone
+# can repeat, but the action object is always a new one.
+def get_state_version() -> tuple:
+    log = game.action_log
+    index = log.action_index
+    last_action = log.actions[index] if 0 <= index < len(log.actions) else None
+    return (log, index, last_action)
+
+# Fires an event if the component has one set. Components with no event set skip the
+# lookup, and a missing event is logged rather than passed on to the event manager.
+def trigger_event(event_nid, unit=None, unit2=None, position=None, local_args=None):
+    if not event_nid:
+        return
+    if DB.events.get_from_nid(event_nid):
+        game.events.trigger_specific_event(event_nid, unit, unit2, position, local_args)
+    else:
+        logging.error("Couldn't find event %s", event_nid)
+
+# Index of skill nid -> skill instances, kept on the unit, so "has skill" checks and
+# stack counts don't need to scan unit.skills. AddSkill appends to the skill list and
+# RemoveSkill takes skills out of it, so the index is rebuilt when the list's length or
+# its last skill changes. Skills are compared as objects, not by uid, since uids are
+# handed out again when a suspend is loaded or a chapter restarts.
+def get_skill_index(unit) -> dict:
+    skills = unit.skills
+    last_skill = skills[-1] if skills else None
+    cached = getattr(unit, '_skill_index', None)
+    if cached and cached[0] is skills and cached[1] == len(skills) and cached[2] is last_skill:
+        return cached[3]
+    index = {}
+    for skill in skills:
+        index.setdefault(skill.nid, []).append(skill)
+    unit._skill_index = (skills, len(skills), last_skill, index)
+    return index
+
+def has_skill(unit, skill_nid) -> bool:
+    return skill_nid in get_skill_index(unit)
+
+def count_skill(unit, skill_nid) -> int:
+    return len(get_skill_index(unit).get(skill_nid, ()))
 
 class DoNothing(SkillComponent):
     nid = 'do_nothing'
@@ -72,7 +103,7 @@ class EventOnTakeHit(SkillComponent):
 
     def after_take_strike(self, actions, playback, unit, item, target, item2, mode, attack_info, strike):
         if target and skill_system.check_enemy(unit, target) and strike == Strike.HIT:
-            game.events.trigger_specific_event(self.value, unit, unit, unit.position, {'item': None, 'mode': None})
+            trigger_event(self.value, unit, unit, unit.position, {'item': None, 'mode': None})
         
 class LostOnStrike(SkillComponent):
     nid = 'lost_on_strike'
@@ -102,12 +133,17 @@ class SelfNihil(SkillComponent):
 
     ignore_conditional = True
 
+    _checked_index = None
+    _condition = True
+
     def condition(self, unit, item):
-        all_target_nihils = set(self.value)
-        for skill in unit.skills:
-          if skill.nid in all_target_nihils:
-            return False
-        return True
+        # get_skill_index hands back a new index whenever this unit's skills change, and a
+        # different unit never shares one, so only look through the list again then
+        index = get_skill_index(unit)
+        if index is not self._checked_index:
+            self._checked_index = index
+            self._condition = not any(skill_nid in index for skill_nid in self.value)
+        return self._condition
 
 class SelfRecoil(SkillComponent):
     nid = 'self_recoil'
@@ -152,7 +188,7 @@ class UpkeepEvent(SkillComponent):
     value = ''
 
     def on_upkeep(self, actions, playback, unit):
-        game.events.trigger_specific_event(self.value, unit, unit, unit.position, {'item': None, 'mode': None})
+        trigger_event(self.value, unit, unit, unit.position, {'item': None, 'mode': None})
 
 class CritEvent(SkillComponent):
     nid = 'crit_event'
@@ -165,7 +201,7 @@ class CritEvent(SkillComponent):
     def end_combat(self, playback, unit, item, target, item2, mode):
         mark_playbacks = [p for p in playback if p.nid in ('mark_crit')]
         if target and any(p.attacker is unit for p in mark_playbacks):
-            game.events.trigger_specific_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
+            trigger_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
 
 class UpkeepSkillGain(SkillComponent):
     nid = 'upkeep_skill_gain'
@@ -206,37 +242,29 @@ class LostOnEndNextCombat(SkillComponent):
 
     def post_combat(self, playback, unit, item, target, item2, mode):
         from app.engine import skill_system
-        remove_skill = False
+        # Each matching kind of combat uses up one, but only one SetObjData goes in the log
+        lost_combats = 0
         if self.values.get('LostOnSelf (T/F)', 'T') == 'T':
             if unit == target:
-                val = int(self.skill.data['combats']) - 1
-                action.do(action.SetObjData(self.skill, 'combats', val))
-                if int(self.skill.data['combats']) <= 0:
-                    remove_skill = True
+                lost_combats += 1
 
         if self.values.get('LostOnAlly (T/F)', 'T') == 'T':
             if target:
                 if skill_system.check_ally(unit, target):
-                    val = int(self.skill.data['combats']) - 1
-                    action.do(action.SetObjData(self.skill, 'combats', val))
-                    if int(self.skill.data['combats']) <= 0:
-                        remove_skill = True
+                    lost_combats += 1
         if self.values.get('LostOnEnemy (T/F)', 'T') == 'T':
             if target:
                 if skill_system.check_enemy(unit, target):
-                    val = int(self.skill.data['combats']) - 1
-                    action.do(action.SetObjData(self.skill, 'combats', val))
-                    if int(self.skill.data['combats']) <= 0:
-                        remove_skill = True
+                    lost_combats += 1
         if self.values.get('LostOnSplash (T/F)', 'T') == 'T':
             if not target:
-                val = int(self.skill.data['combats']) - 1
-                action.do(action.SetObjData(self.skill, 'combats', val))
-                if int(self.skill.data['combats']) <= 0:
-                    remove_skill = True
+                lost_combats += 1
 
-        if remove_skill:
-            action.do(action.RemoveSkill(unit, self.skill))
+        if lost_combats:
+            val = int(self.skill.data['combats']) - lost_combats
+            action.do(action.SetObjData(self.skill, 'combats', val))
+            if val <= 0:
+                action.do(action.RemoveSkill(unit, self.skill))
 
     def on_end_chapter(self, unit, skill):
         action.do(action.RemoveSkill(unit, self.skill))
@@ -355,7 +383,7 @@ class EventAfterKill(SkillComponent):
 
     def end_combat(self, playback, unit, item, target, item2, mode):
         if target and target.get_hp() <= 0:
-            game.events.trigger_specific_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
+            trigger_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
             action.do(action.TriggerCharge(unit, self.skill))
 
 class PermanentDamage(SkillComponent):
@@ -363,67 +391,35 @@ class PermanentDamage(SkillComponent):
     desc = 'All damage taken is dealt to max HP'
     tag = SkillTags.CUSTOM
     
-    def after_strike(self, actions, playback, unit, item, target, item2, mode, attack_info, strike):
-        stat_changes = {}
-        if unit.get_max_hp() > int(unit._fields['Undeath_Current_HP']):
-            for i in range(unit.get_max_hp() - int(unit._fields['Undeath_Current_HP'])):
+    def _sync_max_hp(self, unit):
+        # Every stat change gets its own dict, since the action keeps it for the turnwheel.
+        # Changes that wouldn't do anything are left out of the action log.
+        current_hp = int(unit._fields['Undeath_Current_HP'])
+        if unit.get_max_hp() > current_hp:
+            for i in range(unit.get_max_hp() - current_hp):
                 action.do(action.AddSkill(unit, 'Undying_Will'))
-            stat_changes['HP'] = int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp()
-            action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        elif unit.get_max_hp() < int(unit._fields['Undeath_Current_HP']):
-            action.do(action.RemoveSkill(unit, 'Undying_Will', count=(int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp())))
-            stat_changes['HP'] = min(int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp(), len([skill.nid for skill in unit.skills if skill.nid == 'Undying_Will']) - unit.get_max_hp())
-            action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        stat_changes['HP'] = max(unit.get_hp() - unit.get_max_hp(), 1 - unit.get_max_hp())
-        action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        action.do(action.ChangeField(unit, key='Undeath_Current_HP', value=unit.get_max_hp()))
+            action.do(action.ApplyStatChanges(unit, {'HP': current_hp - unit.get_max_hp()}, False))
+        elif unit.get_max_hp() < current_hp:
+            action.do(action.RemoveSkill(unit, 'Undying_Will', count=(current_hp - unit.get_max_hp())))
+            hp_change = min(current_hp - unit.get_max_hp(), count_skill(unit, 'Undying_Will') - unit.get_max_hp())
+            action.do(action.ApplyStatChanges(unit, {'HP': hp_change}, False))
+        hp_change = max(unit.get_hp() - unit.get_max_hp(), 1 - unit.get_max_hp())
+        if hp_change:
+            action.do(action.ApplyStatChanges(unit, {'HP': hp_change}, False))
+        if current_hp != unit.get_max_hp():
+            action.do(action.ChangeField(unit, key='Undeath_Current_HP', value=unit.get_max_hp()))
+
+    def after_strike(self, actions, playback, unit, item, target, item2, mode, attack_info, strike):
+        self._sync_max_hp(unit)
 
     def after_take_strike(self, actions, playback, unit, item, target, item2, mode, attack_info, strike):
-        stat_changes = {}
-        if unit.get_max_hp() > int(unit._fields['Undeath_Current_HP']):
-            for i in range(unit.get_max_hp() - int(unit._fields['Undeath_Current_HP'])):
-                action.do(action.AddSkill(unit, 'Undying_Will'))
-            stat_changes['HP'] = int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp()
-            action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        elif unit.get_max_hp() < int(unit._fields['Undeath_Current_HP']):
-            action.do(action.RemoveSkill(unit, 'Undying_Will', count=(int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp())))
-            stat_changes['HP'] = min(int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp(), len([skill.nid for skill in unit.skills if skill.nid == 'Undying_Will']) - unit.get_max_hp())
-            action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        stat_changes['HP'] = max(unit.get_hp() - unit.get_max_hp(), 1 - unit.get_max_hp())
-        action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        action.do(action.ChangeField(unit, key='Undeath_Current_HP', value=unit.get_max_hp()))
-        
+        self._sync_max_hp(unit)
+
     def cleanup_combat(self, playback, unit, item, target, item2, mode):
-        stat_changes = {}
-        if unit.get_max_hp() > int(unit._fields['Undeath_Current_HP']):
-            for i in range(unit.get_max_hp() - int(unit._fields['Undeath_Current_HP'])):
-                action.do(action.AddSkill(unit, 'Undying_Will'))
-            stat_changes['HP'] = int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp()
-            action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        elif unit.get_max_hp() < int(unit._fields['Undeath_Current_HP']):
-            action.do(action.RemoveSkill(unit, 'Undying_Will', count=(int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp())))
-            stat_changes['HP'] = min(int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp(), len([skill.nid for skill in unit.skills if skill.nid == 'Undying_Will']) - unit.get_max_hp())
-            action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        stat_changes['HP'] = max(unit.get_hp() - unit.get_max_hp(), 1 - unit.get_max_hp())
-        action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        action.do(action.ChangeField(unit, key='Undeath_Current_HP', value=unit.get_max_hp()))
-        
+        self._sync_max_hp(unit)
+
     def end_combat(self, playback, unit, item, target, item2, mode):
-        print(unit.get_max_hp())
-        print(int(unit._fields['Undeath_Current_HP']))
-        stat_changes = {}
-        if unit.get_max_hp() > int(unit._fields['Undeath_Current_HP']):
-            for i in range(unit.get_max_hp() - int(unit._fields['Undeath_Current_HP'])):
-                action.do(action.AddSkill(unit, 'Undying_Will'))
-            stat_changes['HP'] = int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp()
-            action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        elif unit.get_max_hp() < int(unit._fields['Undeath_Current_HP']):
-            action.do(action.RemoveSkill(unit, 'Undying_Will', count=(int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp())))
-            stat_changes['HP'] = min(int(unit._fields['Undeath_Current_HP']) - unit.get_max_hp(), len([skill.nid for skill in unit.skills if skill.nid == 'Undying_Will']) - unit.get_max_hp())
-            action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        stat_changes['HP'] = max(unit.get_hp() - unit.get_max_hp(), 1 - unit.get_max_hp())
-        action.do(action.ApplyStatChanges(unit, stat_changes, False))
-        action.do(action.ChangeField(unit, key='Undeath_Current_HP', value=unit.get_max_hp()))
+        self._sync_max_hp(unit)
 
 class EvalUpkeepDamage(SkillComponent):
     nid = 'eval_upkeep_damage'
@@ -657,18 +653,40 @@ class RemoveStatusAfterCombat(SkillComponent):
             action.do(action.RemoveSkill(target, self.value))
             action.do(action.TriggerCharge(unit, self.skill))
 
+# The proc lookups below ask a skill for the same hook on every strike. Each skill
+# remembers which of its components defines a hook the first time it is asked.
+def get_hook_component(skill, hook):
+    table = getattr(skill, '_hook_table', None)
+    if table is None:
+        table = skill._hook_table = {}
+    if hook not in table:
+        table[hook] = next((component for component in skill.components if component.defines(hook)), None)
+    return table[hook]
+
 def get_weapon_filter(skill, unit, item) -> bool:
-    for component in skill.components:
-        if component.defines('weapon_filter'):
-            return component.weapon_filter(unit, item)
+    component = get_hook_component(skill, 'weapon_filter')
+    if component:
+        return component.weapon_filter(unit, item)
     return True
 
+def get_proc_rate(unit, skill) -> int:
+    component = get_hook_component(skill, 'proc_rate')
+    if component:
+        return component.proc_rate(unit)
+    return 100  # 100 is default
+
 def get_proc_rate_with_target(unit, target, skill) -> int:
-    for component in skill.components:
-        if component.defines('proc_rate'):
-            return component.proc_rate(unit, target)
+    component = get_hook_component(skill, 'proc_rate')
+    if component:
+        return component.proc_rate(unit, target)
     return 100  # 100 is default
 
+def get_pc_damage(unit, skill) -> int:
+    component = get_hook_component(skill, 'post_combat_damage')
+    if component:
+        return component.post_combat_damage()
+    return 0  # 0 is default
+
 class EvalProcRate(SkillComponent):
     nid = 'eval_proc_rate'
     desc = "Evaluates the proc rate. Only compatible with custom Proc components."
@@ -843,7 +861,7 @@ class TrueMiracleEvent(SkillComponent):
 
         if did_something:
             actions.append(action.TriggerCharge(unit, self.skill))
-            game.events.trigger_specific_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
+            trigger_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
 
 class GiveStatusesOnTakeHit(SkillComponent):
     nid = 'give_statuses_on_take_hit'
@@ -904,7 +922,7 @@ class CombatArtAll(SkillComponent):
     def end_combat_unconditional(self, playback, unit, item, target, item2, mode):
         if self.skill.data.get('active'):
             for ally in game.get_all_units_in_party():
-                if ally.nid != unit.nid and self.value in [s.nid for s in ally.skills]:
+                if ally.nid != unit.nid and has_skill(ally, self.value):
                     action.do(action.TriggerCharge(ally, ally.get_skill(self.value)))
 
 class GrowthChangeExpression(SkillComponent):
@@ -1078,11 +1096,11 @@ class StartAndEndEventInitiate(SkillComponent):
 
     def start_combat(self, playback, unit, item, target, item2, mode):
         if mode == 'attack':
-            game.events.trigger_specific_event(self.value.get('start_event'), unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
+            trigger_event(self.value.get('start_event'), unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
     
     def end_combat(self, playback, unit: UnitObject, item, target: UnitObject, item2, mode):
         if mode == 'attack':
-            game.events.trigger_specific_event(self.value.get('end_event'), unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
+            trigger_event(self.value.get('end_event'), unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
 
 class BetterPostCombatDamage(SkillComponent):
     nid = 'better_post_combat_damage'
@@ -1163,25 +1181,50 @@ class DrainChargeAll(SkillComponent):
         self.skill.data['charge'] = self.value
         self.skill.data['total_charge'] = self.value
 
+    # Holders in the main party (Flex counts as the main party) share one charge, kept
+    # once in a game var. Any other holder uses the charge on its own skill.
+    def _pool_nid(self, unit):
+        party = game.current_party
+        if unit and unit.party in (party, 'Flex'):
+            return '_drain_charge_all_%s_%s' % (party, self.skill.nid)
+        return None
+
+    def _get_charge(self, unit) -> int:
+        pool_nid = self._pool_nid(unit)
+        if pool_nid:
+            if pool_nid not in game.game_vars:
+                # Seed the pool from this holder's charge without an action, like init does
+                # for skill.data, so the first SetGameVar has a real value to rewind to
+                game.game_vars[pool_nid] = self.skill.data['charge']
+            return game.game_vars[pool_nid]
+        return self.skill.data['charge']
+
+    def _get_owner(self):
+        return game.get_unit(self.skill.owner_nid)
+
     def condition(self, unit, item):
-        return self.skill.data['charge'] > 0
+        return self._get_charge(unit) > 0
 
     def on_end_chapter(self, unit, skill):
+        # Don't need to use action here because it will be end of chapter
         self.skill.data['charge'] = self.skill.data['total_charge']
+        pool_nid = self._pool_nid(unit)
+        if pool_nid:
+            game.game_vars[pool_nid] = self.skill.data['total_charge']
 
     def trigger_charge(self, unit, skill):
-        new_value = self.skill.data['charge'] - 1
-        action.do(action.SetObjData(self.skill, 'charge', new_value))
-        combined_parties = game.get_all_units_in_party() + game.get_all_units_in_party('Flex')
-        for ally in combined_parties:
-            if ally.nid != unit.nid and self.skill.nid in [s.nid for s in ally.skills]:
-                action.do(action.SetObjData(ally.get_skill(self.skill.nid), 'charge', new_value))
+        new_value = self._get_charge(unit) - 1
+        pool_nid = self._pool_nid(unit)
+        if pool_nid:
+            action.do(action.SetGameVar(pool_nid, new_value))
+        else:
+            action.do(action.SetObjData(self.skill, 'charge', new_value))
 
     def text(self) -> str:
-        return str(self.skill.data['charge'])
+        return str(self._get_charge(self._get_owner()))
 
     def cooldown(self):
-        return self.skill.data['charge'] / self.skill.data['total_charge']
+        return self._get_charge(self._get_owner()) / self.skill.data['total_charge']
 
 class ArmsthriftAlways(SkillComponent):
     nid = 'armsthrift_always'
@@ -1497,7 +1540,7 @@ class RescueBonus(SkillComponent):
         action.do(action.AddSkill(leader, self.value))
 
     def on_drop(self, unit, leader):
-        if self.value in [skill.nid for skill in leader.skills]:
+        if has_skill(leader, self.value):
             action.do(action.RemoveSkill(leader, self.value))
 
 class RescueBonuses(SkillComponent):
@@ -1513,7 +1556,7 @@ class RescueBonuses(SkillComponent):
 
     def on_drop(self, unit, leader):
         for status in self.value:
-            if status in [skill.nid for skill in leader.skills]:
+            if has_skill(leader, status):
                 action.do(action.RemoveSkill(leader, status))
 
 class AoeGainSkillAfterCombat(SkillComponent):
@@ -1575,7 +1618,7 @@ class EventAfterCombatIfTakeDamage(SkillComponent):
 
     def end_combat(self, playback, unit, item, target, item2, mode):
         if self.got_hit:
-            game.events.trigger_specific_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
+            trigger_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
         self.got_hit = False
 
 class StatChangeAtApplyExpression(SkillComponent):
@@ -1616,7 +1659,10 @@ class EvalCanter(SkillComponent):
 
     expose = ComponentType.String
 
-    def canto_movement(self, unit, unit2) -> int:
+    _canto_key = None
+    _canto_value = 0
+
+    def _canto_movement(self, unit, unit2) -> int:
         from app.engine import evaluate
         try:
             if 'NullCanto' in unit.tags:
@@ -1627,6 +1673,15 @@ class EvalCanter(SkillComponent):
             logging.error("Couldn't evaluate %s conditional" % self.value)
         return 0
 
+    def canto_movement(self, unit, unit2) -> int:
+        # Range queries (movement display, AI, threat ranges) ask for this repeatedly,
+        # so keep the result until the action log moves on
+        key = (unit.nid, unit2.nid if unit2 else None, get_state_version())
+        if key != self._canto_key:
+            self._canto_key = key
+            self._canto_value = self._canto_movement(unit, unit2)
+        return self._canto_value
+
     def has_canto(self, unit, unit2) -> bool:
         """
         Can move again after any action, has exactly the number of movement that was determined in the component
@@ -1921,7 +1976,7 @@ class EventOnGainSkill(SkillComponent):
     value = ''
 
     def after_add(self, unit, skill):
-        game.events.trigger_specific_event(self.value, unit, unit, unit.position, {'skill': skill})
+        trigger_event(self.value, unit, unit, unit.position, {'skill': skill})
 
 class ExtraTriangleAdvantage(SkillComponent):
     nid = 'extra_triangle_advantage'
@@ -1980,9 +2035,9 @@ class AttackProcEnemy(SkillComponent):
 
     def start_sub_combat(self, actions, playback, unit, item, target, item2, mode, attack_info):
         if mode == 'attack' and target and skill_system.check_enemy(unit, target):
-            if not advanced_components.get_weapon_filter(self.skill, unit, item):
+            if not get_weapon_filter(self.skill, unit, item):
                 return
-            proc_rate = advanced_components.get_proc_rate(unit, self.skill)
+            proc_rate = get_proc_rate(unit, self.skill)
             if static_random.get_combat() < proc_rate:
                 act = action.AddSkill(target, self.value)
                 action.do(act)
@@ -2163,9 +2218,7 @@ class EventOnUpkeep(SkillComponent):
     expose = ComponentType.Event
 
     def on_upkeep(self, actions, playback, unit):
-        event_prefab = DB.events.get_from_nid(self.value)
-        if event_prefab:
-            game.events.trigger_specific_event(event_prefab.nid, unit, unit.position)
+        trigger_event(self.value, unit, position=unit.position)
 
 class CritProc(SkillComponent):
     nid = 'crit_proc'
@@ -2230,12 +2283,9 @@ class NegatedBySkills(SkillComponent):
     _condition = True
 
     def pre_combat(self, playback, unit, item, target, item2, mode):
-        all_negates = set(self.value)
-        if target:
-            for skill in target.skills:
-                if skill.nid in all_negates:
-                    self._condition = False
-                    return
+        if target and any(has_skill(target, skill_nid) for skill_nid in self.value):
+            self._condition = False
+            return
         self._condition = True
 
     def post_combat(self, playback, unit, item, target, item2, mode):
@@ -2259,8 +2309,13 @@ class UnitFlickeringTintIntense(SkillComponent):
 
     expose = ComponentType.Color3
 
+    _flicker_tint = None
+
     def unit_sprite_flicker_tint(self, unit, skill) -> tuple:
-        return (self.value, 400, 300)
+        # Read every frame, so build the tuple (and convert the color) only once
+        if self._flicker_tint is None:
+            self._flicker_tint = (tuple(self.value), 400, 300)
+        return self._flicker_tint
 
 class UnitFlickeringTintSlow(SkillComponent):
     nid = 'unit_flickering_tint_slow'
@@ -2271,8 +2326,12 @@ class UnitFlickeringTintSlow(SkillComponent):
 
     expose = ComponentType.Color3
 
+    _flicker_tint = None
+
     def unit_sprite_flicker_tint(self, unit, skill) -> tuple:
-        return (self.value, 1300, 300)
+        if self._flicker_tint is None:
+            self._flicker_tint = (tuple(self.value), 1300, 300)
+        return self._flicker_tint
 
 class ModifySpecMaximumRange(SkillComponent):
     nid = 'modify__spec_maximum_range'
@@ -2405,12 +2464,6 @@ class PostCombatSplashHealAOE(SkillComponent):
                         end_health = target2.get_hp() + healing
                         action.do(action.SetHP(target2, min(target2.get_max_hp(), end_health)))
 
-    def get_pc_damage(unit, skill) -> int:
-        for component in skill.components:
-            if component.defines('post_combat_damage'):
-                return component.post_combat_damage()
-        return 0  # 0 is default
-
 class GiveStatusBeforeCombat(SkillComponent):
     nid = 'give_status_before_combat'
     desc = "Gives a status to target enemy before combat"
@@ -2785,7 +2838,7 @@ class EventBeforeCombat(SkillComponent):
     value = ''
 
     def start_combat(self, playback, unit: UnitObject, item, target: UnitObject, item2, mode):
-        game.events.trigger_specific_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
+        trigger_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
 
 class EventAfterCombat(SkillComponent):
     nid = 'event_after_combat'
@@ -2796,7 +2849,7 @@ class EventAfterCombat(SkillComponent):
     value = ''
 
     def end_combat(self, playback, unit: UnitObject, item, target: UnitObject, item2, mode):
-        game.events.trigger_specific_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
+        trigger_event(self.value, unit, target, unit.position, {'item': item, 'item2': item2, 'mode': mode})
 
 class EndstepEvent(SkillComponent):
     nid = 'endstep_event'
@@ -2807,7 +2860,7 @@ class EndstepEvent(SkillComponent):
     value = ''
 
     def on_endstep(self, actions, playback, unit):
-        game.events.trigger_specific_event(self.value, unit, None, unit.position, local_args={})
+        trigger_event(self.value, unit, None, unit.position, local_args={})
 
 class DynamicResistMultiplier(SkillComponent):
     nid = 'dynamic_resist_multiplier'
@@ -2857,17 +2910,3 @@ class DefenseProcWhenHit(SkillComponent):
             action.do(action.RemoveSkill(unit, self.value))
         self._got_hit = False
         self._did_action = False
-        
-    def get_proc_rate(unit, skill) -> int:
-        for component in skill.components:
-            if component.defines('proc_rate'):
-                return component.proc_rate(unit)
-        return 100  # 100 is default
-
-
-    def get_weapon_filter(skill, unit, item) -> bool:
-        for component in skill.components:
-            if component.defines('weapon_filter'):
-                return component.weapon_filter(unit, item)
-        return True
- 